@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.models import User
+
+
+class TokenCache:
+    key_prefix = 'auth-token:'
+    shared_user_fields = (
+        'id',
+        'email',
+        'username',
+        'first_name',
+        'last_name',
+        'avatar',
+        'avatar_processed',
+        'is_active',
+        'is_staff',
+        'is_superuser',
+        'updated_at',
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.stats = Counter()
+
+    def get(self, key):
+        with self.lock:
+            expires, token = self.entries.get(key, (0, None))
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.stats['local_hits'] += 1
+                return token
+            self.entries.pop(key, None)
+        if settings.AUTH_TOKEN_SHARED_CACHE_TTL:
+            payload = cache.get(self.key_prefix + key)
+            if payload is not None:
+                token = self.load(key, payload)
+                self.stats['shared_hits'] += 1
+                self.set_local(key, token)
+                return token
+        self.stats['misses'] += 1
+        return None
+
+    def dump(self, token):
+        return {
+            'created': token.created,
+            'user': {
+                name: getattr(value, 'name', value)
+                for name, value in (
+                    (name, getattr(token.user, name))
+                    for name in self.shared_user_fields
+                )
+            },
+        }
+
+    def load(self, key, payload):
+        names = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in payload['user']
+        ]
+        user = User.from_db(
+            None, names, [payload['user'][name] for name in names]
+        )
+        token = Token.from_db(
+            None,
+            ('key', 'user_id', 'created'),
+            (key, user.pk, payload['created']),
+        )
+        token.user = user
+        return token
+
+    def set_local(self, key, token):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL,
+                token,
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def set(self, key, token):
+        self.set_local(key, token)
+        if settings.AUTH_TOKEN_SHARED_CACHE_TTL:
+            cache.set(
+                self.key_prefix + key,
+                self.dump(token),
+                settings.AUTH_TOKEN_SHARED_CACHE_TTL,
+            )
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        cache.delete_many([self.key_prefix + key for key in keys])
+        self.stats['invalidations'] += len(keys)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        hits = self.stats['local_hits'] + self.stats['shared_hits']
+        total = hits + self.stats['misses']
+        stats['hit_ratio'] = hits / total if total else 0
+        stats['size'] = len(self.entries)
+        return stats
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        elif not token.user.is_active:
+            token_cache.delete(key)
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
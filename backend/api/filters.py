@@ -1,8 +1,33 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Q
+from django.db.models.functions import Upper
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Recipe, User
 
 
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity', '-id'),
+    'newest': ('-pub_date', '-id'),
+    'quickest': ('cooking_time', 'id'),
+}
+
+
+def search_by_name(queryset, value):
+    value = value.upper()
+    return (
+        queryset.annotate(
+            upper_name=Upper('name'),
+            similarity=TrigramSimilarity(Upper('name'), value),
+        )
+        .filter(
+            Q(upper_name__contains=value)
+            | Q(upper_name__trigram_similar=value)
+        )
+        .order_by('-similarity', 'name')
+    )
+
+
 class RecipeFilter(FilterSet):
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all(),
@@ -16,12 +41,23 @@ class RecipeFilter(FilterSet):
         method='filter_is_favorited',
     )
 
+    search = filters.CharFilter(
+        method='filter_search',
+    )
+
+    ordering = filters.ChoiceFilter(
+        choices=[(ordering, ordering) for ordering in RECIPE_ORDERINGS],
+        method='filter_ordering',
+    )
+
     class Meta:
         model = Recipe
         fields = (
             'author',
             'is_in_shopping_cart',
             'is_favorited',
+            'search',
+            'ordering',
         )
 
     def filter_is_favorited(self, queryset, name, value):
@@ -33,3 +69,9 @@ class RecipeFilter(FilterSet):
         if self.request.user.is_authenticated and value:
             return queryset.filter(shopping_cart__author=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_by_name(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
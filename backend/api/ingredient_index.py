@@ -0,0 +1,46 @@
+import bisect
+import threading
+
+from recipes.models import Ingredient
+from recipes.services import get_ingredients_version
+
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.data = ([], [])
+
+    def build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda item: (item['name'].casefold(), item['id']),
+        )
+        self.data = (
+            [item['name'].casefold() for item in ingredients],
+            ingredients,
+        )
+        self.version = version
+
+    def get_data(self):
+        version = get_ingredients_version()
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build(version)
+        return self.data
+
+    def search(self, prefix='', limit=None):
+        keys, ingredients = self.get_data()
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_right(keys, prefix + MAX_CHAR, lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return ingredients[start:end]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,87 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework.response import Response
+
+from recipes.services import get_recipes_version
+
+
+class AnonymousCacheMixin:
+    anonymous_cache_prefix = 'anonymous-response:'
+
+    def get_anonymous_cache_key(self, request):
+        query = urlencode(
+            sorted(
+                (key, sorted(values))
+                for key, values in request.query_params.lists()
+            ),
+            doseq=True,
+        )
+        url = f'{request.build_absolute_uri(request.path)}?{query}'
+        etag = getattr(self, 'etag', None)
+        if etag is not None:
+            url = f'{url}:{etag}'
+        return (
+            self.anonymous_cache_prefix
+            + hashlib.md5(url.encode()).hexdigest()
+        )
+
+    def cached_for_anonymous(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_anonymous_cache_key(request)
+        version = get_recipes_version()
+        data = cache.get(key, version=version)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(
+                key,
+                response.data,
+                settings.ANONYMOUS_RESPONSE_CACHE_TIMEOUT,
+                version=version,
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_for_anonymous(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_for_anonymous(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ConditionalGetMixin:
+    def conditional(self, handler, validators, request, *args, **kwargs):
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        parts, last_modified = validators
+        etag = quote_etag(
+            hashlib.md5(
+                ':'.join(map(str, (
+                    request.accepted_renderer.format, *parts
+                ))).encode()
+            ).hexdigest()
+        )
+        self.etag = etag
+        timestamp = (
+            int(last_modified.timestamp()) if last_modified else None
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер изображения не должен превышать {max_size} байт.'
+    default_code = 'upload_too_large'
+
+    def __init__(self):
+        super().__init__(
+            self.default_detail.format(
+                max_size=settings.IMAGE_UPLOAD_MAX_SIZE
+            )
+        )
+
+
+class UploadSizeLimitHandler(FileUploadHandler):
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise UploadTooLarge()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class LimitedMultiPartParser(MultiPartParser):
+    def get_max_length(self):
+        if settings.DATA_UPLOAD_MAX_MEMORY_SIZE is None:
+            return None
+        return (
+            settings.IMAGE_UPLOAD_MAX_SIZE
+            + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        )
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        max_length = self.get_max_length()
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if max_length is not None and length > max_length:
+            raise UploadTooLarge()
+        request.upload_handlers.insert(
+            0, UploadSizeLimitHandler(request._request)
+        )
+        return super().parse(stream, media_type, parser_context)
@@ -1,7 +1,18 @@
 import base64
-from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
-from rest_framework import serializers, status
+import binascii
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+)
+from django.db import transaction
+from django.db.models import Manager
+from django.http import QueryDict
+from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from users.models import User, Follow
@@ -11,18 +22,63 @@ from recipes.models import (
     Ingredient,
     RecipeIngredient,
 )
+from recipes.images import get_srcset
+from recipes.services import (
+    change_recipe_in_totals,
+    get_ingredients_version,
+    lock_recipes,
+)
 
 
 MAX_VALUE = 32_000
 MIN_VALUE = 1
+MAX_BATCH_SIZE = 500
+BASE64_CHUNK_SIZE = 64 * 1024
 
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'invalid_base64': 'Некорректное изображение в формате base64.',
+        'max_size': 'Размер изображения не должен превышать {max_size} байт.',
+    }
+
+    def check_size(self, size):
+        if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('max_size', max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
+
+    def decode(self, data):
+        header, separator, encoded = data.partition(';base64,')
+        if not separator or len(encoded) % 4:
+            self.fail('invalid_base64')
+        content_type = header[len('data:'):]
+        size = len(encoded) // 4 * 3 - (
+            len(encoded) - len(encoded.rstrip('='))
+        )
+        self.check_size(size)
+
+        name = 'temp.' + content_type.split('/')[-1]
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile(name, content_type, size, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, name, content_type, size, None
+            )
+        try:
+            for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    encoded[start:start + BASE64_CHUNK_SIZE], validate=True
+                ))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.seek(0)
+        return file
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(data)
+        elif getattr(data, 'size', None) is not None:
+            self.check_size(data.size)
         return super().to_internal_value(data)
 
 
@@ -60,6 +116,8 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {'is_subscribed': {'read_only': True}}
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return (
             not user.is_anonymous
@@ -74,6 +132,11 @@ class SetAvatarSerializer(serializers.ModelSerializer):
         model = User
         fields = ('avatar',)
 
+    def update(self, instance, validated_data):
+        instance.avatar = validated_data['avatar']
+        instance.save(update_fields=['avatar', 'updated_at'])
+        return instance
+
 
 class FollowSerializer(serializers.ModelSerializer):
     email = serializers.ReadOnlyField(
@@ -98,11 +161,15 @@ class FollowSerializer(serializers.ModelSerializer):
 
     avatar = serializers.SerializerMethodField()
 
+    avatar_srcset = serializers.SerializerMethodField()
+
     is_subscribed = serializers.SerializerMethodField()
 
     recipes = serializers.SerializerMethodField()
 
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField(
+        source='author.recipes_count',
+    )
 
     class Meta:
         model = Follow
@@ -116,6 +183,7 @@ class FollowSerializer(serializers.ModelSerializer):
             'recipes',
             'recipes_count',
             'avatar',
+            'avatar_srcset',
         )
 
     def get_is_subscribed(self, obj):
@@ -131,7 +199,18 @@ class FollowSerializer(serializers.ModelSerializer):
             )
         return None
 
+    def get_avatar_srcset(self, obj):
+        return get_srcset(
+            obj.author.avatar,
+            obj.author.avatar_processed,
+            self.context.get('request'),
+        )
+
     def get_recipes(self, obj):
+        if hasattr(obj, 'author_recipes'):
+            return RecipeMinifiedSerializer(
+                obj.author_recipes, many=True
+            ).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         recipes = obj.author.recipes.all()
@@ -139,26 +218,6 @@ class FollowSerializer(serializers.ModelSerializer):
             recipes = recipes[: int(limit)]
         return RecipeMinifiedSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
-
-    def validate(self, data):
-        author = self.context.get('author')
-        user = self.context['request'].user
-
-        if user.follower.filter(author=author).exists():
-            raise ValidationError(
-                {'detail': ['Вы уже подписаны на этого пользователя!']},
-                code=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if user == author:
-            raise ValidationError(
-                {'detail': ['Невозможно подписаться на себя!']},
-                code=status.HTTP_400_BAD_REQUEST,
-            )
-        return data
-
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -194,6 +253,79 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeFragmentListSerializer(serializers.ListSerializer):
+    fragment_prefix = 'recipe-fragment:'
+
+    def get_fragment_key(self, recipe, ingredients_version):
+        base_url = self.context['request'].build_absolute_uri('/')
+        author_updated_at = getattr(recipe, 'author_updated_at', None)
+        if author_updated_at is None:
+            author_updated_at = recipe.author.updated_at
+        return (
+            f'{self.fragment_prefix}{base_url}:{recipe.pk}:'
+            f'{recipe.updated_at.timestamp()}:'
+            f'{author_updated_at.timestamp()}:{ingredients_version}'
+        )
+
+    def render_fragments(self, recipe_ids):
+        fragments = {}
+        for recipe in Recipe.objects.with_related().filter(
+            pk__in=recipe_ids
+        ):
+            recipe.is_favorited = False
+            recipe.is_in_shopping_cart = False
+            recipe.is_author_subscribed = False
+            fragments[recipe.pk] = self.child.to_representation(recipe)
+        return fragments
+
+    def get_fragments(self, recipes):
+        ingredients_version = get_ingredients_version()
+        keys = {recipe.pk: self.get_fragment_key(recipe, ingredients_version)
+                for recipe in recipes}
+        cached = cache.get_many(keys.values())
+        fragments = {
+            recipe_id: cached[key]
+            for recipe_id, key in keys.items()
+            if key in cached
+        }
+        missing = keys.keys() - fragments.keys()
+        if missing:
+            rendered = self.render_fragments(missing)
+            cache.set_many(
+                {
+                    keys[recipe_id]: fragment
+                    for recipe_id, fragment in rendered.items()
+                },
+                settings.RECIPE_FRAGMENT_CACHE_TIMEOUT,
+            )
+            fragments.update(rendered)
+        return fragments
+
+    def overlay_user_flags(self, fragment, recipe):
+        return {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': getattr(
+                    recipe, 'is_author_subscribed', False
+                ),
+            },
+            'is_favorited': getattr(recipe, 'is_favorited', False),
+            'is_in_shopping_cart': getattr(
+                recipe, 'is_in_shopping_cart', False
+            ),
+        }
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        fragments = self.get_fragments(recipes)
+        return [
+            self.overlay_user_flags(fragments[recipe.pk], recipe)
+            for recipe in recipes
+            if recipe.pk in fragments
+        ]
+
+
 class RecipeListSerializer(serializers.ModelSerializer):
     author = UserSerializer()
 
@@ -207,6 +339,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
 
     is_in_shopping_cart = serializers.SerializerMethodField()
 
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = (
@@ -217,18 +351,34 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeFragmentListSerializer
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (
             not user.is_anonymous
             and (user.favorite.filter(recipe=obj).exists())
         )
 
+    def get_image_srcset(self, obj):
+        return get_srcset(
+            obj.image, obj.image_processed, self.context.get('request')
+        )
+
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return not user.is_anonymous and (
             user.shopping_cart.filter(recipe=obj).exists()
@@ -236,9 +386,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-    )
+    id = serializers.IntegerField()
 
     amount = serializers.IntegerField(
         max_value=MAX_VALUE,
@@ -281,28 +429,54 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'author',
         )
 
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict) and isinstance(
+            data.get('ingredients'), str
+        ):
+            data = data.dict()
+            try:
+                data['ingredients'] = json.loads(data['ingredients'])
+            except ValueError:
+                raise ValidationError(
+                    {'ingredients': ['Ингредиенты должны быть JSON-списком.']}
+                )
+        return super().to_internal_value(data)
+
     def validate_ingredients(self, value):
         if not value:
-            serializers.ValidationError(
-                {'ingredients': [
-                    'Необходимо указать хотя бы один ингредиент.']},
+            raise ValidationError(
+                'Необходимо указать хотя бы один ингредиент.'
             )
 
-        ingredients = set()
-        for item in value:
-            ingredient = get_object_or_404(Ingredient, name=item['id'])
-            if ingredient in ingredients:
-                raise ValidationError(
-                    {'ingredients': ['Ингридиенты повторяются!']},
-                )
+        ids = [item['id'] for item in value]
+        duplicates = sorted({pk for pk in ids if ids.count(pk) > 1})
+        if duplicates:
+            raise ValidationError(
+                f'Ингридиенты повторяются: {duplicates}'
+            )
+
+        ingredients = Ingredient.objects.in_bulk(ids)
+        missing = sorted(set(ids) - ingredients.keys())
+        if missing:
+            raise ValidationError(
+                f'Ингредиенты не найдены: {missing}'
+            )
 
-            ingredients.add(ingredient)
+        for item in value:
+            item['id'] = ingredients[item['id']]
         return value
 
     def to_representation(self, instance):
+        instance = (
+            Recipe.objects.with_related()
+            .with_user_flags(self.context['request'].user)
+            .get(pk=instance.pk)
+        )
         return RecipeListSerializer(instance, context=self.context).data
 
     def add_ingredients(self, ingredients, model):
+        if not ingredients:
+            return
         RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
                 recipe=model,
@@ -312,6 +486,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             for ingredient in ingredients
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         if ingredients is None or ingredients == []:
@@ -323,19 +498,65 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self.add_ingredients(ingredients, recipe)
         return recipe
 
-    def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients', None)
-        if ingredients is None or ingredients == []:
-            raise serializers.ValidationError(
-                {'ingredients': [
-                    'Необходимо указать хотя бы один ингредиент!']},
+    def update_ingredients(self, recipe, ingredients):
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
             )
-        instance.ingredients.clear()
-        self.add_ingredients(ingredients, instance)
-        return super().update(instance, validated_data)
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        new_amounts = {
+            item['id'].pk: item['amount'] for item in ingredients
+        }
+
+        removed = [
+            recipe_ingredient.pk
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id not in new_amounts
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+
+        self.add_ingredients(
+            [item for item in ingredients if item['id'].pk not in current],
+            recipe,
+        )
+        change_recipe_in_totals(recipe, old_amounts, new_amounts)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        lock_recipes([instance.pk])
+        if 'ingredients' in validated_data:
+            ingredients = validated_data.pop('ingredients')
+            if not ingredients:
+                raise serializers.ValidationError(
+                    {'ingredients': [
+                        'Необходимо указать хотя бы один ингредиент!']},
+                )
+            self.update_ingredients(instance, ingredients)
+        validated_data.pop('author', None)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = (
@@ -343,9 +564,26 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
             'name',
             'cooking_time',
             'image',
+            'image_srcset',
         )
         read_only_fields = fields
 
+    def get_image_srcset(self, obj):
+        return get_srcset(
+            obj.image, obj.image_processed, self.context.get('request')
+        )
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=MIN_VALUE),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
 
 class RecipeShortLinkSerializer(serializers.ModelSerializer):
     short_link = serializers.SerializerMethodField()
@@ -1,29 +1,121 @@
-from django.db.models import Sum
+import csv
+import os
 from datetime import date
-from django.http import HttpResponse
+from tempfile import SpooledTemporaryFile
 
-from recipes.models import RecipeIngredient
+from django.conf import settings
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
 
+from recipes.models import ShoppingCartIngredient
 
-def shopping_cart(self, request, author):
-    sum_ingredients_in_recipes = (
-        RecipeIngredient.objects.filter(recipe__shopping_cart__author=author)
-        .values('ingredient__name', 'ingredient__measurement_unit')
-        .annotate(amounts=Sum('amount', distinct=True))
-        .order_by('amounts')
+
+ITERATOR_CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+
+
+def get_shopping_cart_ingredients(author):
+    return (
+        ShoppingCartIngredient.objects.filter(author=author)
+        .values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            amounts=F('amount'),
+        )
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
     )
 
+
+def get_title():
     today = date.today().strftime('%d-%m-%Y')
-    shopping_list = f'Список покупок. Дата: {today}\n\n'
-    for ingredient in sum_ingredients_in_recipes:
-        shopping_list += (
-            f'{ingredient["ingredient__name"]} - '
-            f'{ingredient["amounts"]} '
-            f'{ingredient["ingredient__measurement_unit"]}\n'
-        )
-    shopping_list += '\nСписок покупок (2025)'
-    filename = 'shopping_list.txt'
-    response = HttpResponse(shopping_list, content_type='text/plain')
+    return f'Список покупок. Дата: {today}'
+
+
+def format_ingredient(ingredient):
+    return (
+        f'{ingredient["ingredient__name"]} - '
+        f'{ingredient["amounts"]} '
+        f'{ingredient["ingredient__measurement_unit"]}'
+    )
+
+
+def shopping_list_txt(ingredients):
+    yield f'{get_title()}\n\n'
+    for ingredient in ingredients:
+        yield f'{format_ingredient(ingredient)}\n'
+    yield '\nСписок покупок (2025)'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def shopping_list_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amounts'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def get_pdf_font():
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if not os.path.exists(font_path):
+        return 'Helvetica'
+    font_name = os.path.splitext(os.path.basename(font_path))[0]
+    if font_name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(font_name, font_path))
+    return font_name
+
+
+def shopping_list_pdf(ingredients):
+    font = get_pdf_font()
+    width, height = A4
+    with SpooledTemporaryFile(max_size=FILE_CHUNK_SIZE * 16) as buffer:
+        document = canvas.Canvas(buffer, pagesize=A4)
+        document.setTitle(get_title())
+        document.setFont(font, PDF_FONT_SIZE)
+        document.drawString(PDF_MARGIN, height - PDF_MARGIN, get_title())
+        y = height - PDF_MARGIN - 2 * PDF_LINE_HEIGHT
+        for ingredient in ingredients:
+            if y < PDF_MARGIN:
+                document.showPage()
+                document.setFont(font, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            document.drawString(PDF_MARGIN, y, format_ingredient(ingredient))
+            y -= PDF_LINE_HEIGHT
+        document.save()
+        buffer.seek(0)
+        while chunk := buffer.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (shopping_list_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_list_csv, 'text/csv; charset=utf-8'),
+    'pdf': (shopping_list_pdf, 'application/pdf'),
+}
+
+
+def shopping_cart(ingredients, file_format='txt'):
+    generator, content_type = SHOPPING_LIST_FORMATS[file_format]
+    response = StreamingHttpResponse(
+        generator(ingredients),
+        content_type=content_type,
+    )
+    filename = f'shopping_list.{file_format}'
     response['Content-Disposition'] = f'attachment; filename={filename}'
 
     return response
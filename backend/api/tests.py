@@ -0,0 +1,317 @@
+import base64
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.client import (
+    BOUNDARY,
+    MULTIPART_CONTENT,
+    encode_multipart,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from jobs.models import Job
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from users.models import Follow, User
+
+
+RECIPES_COUNT = 60
+
+
+class RecipeListQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@foodgram.local', username='reader'
+        )
+        authors = [
+            User.objects.create(
+                email=f'author{number}@foodgram.local',
+                username=f'author{number}',
+            )
+            for number in range(3)
+        ]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient{number}', measurement_unit='г')
+            for number in range(5)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[number % len(authors)],
+                name=f'recipe{number}',
+                text='text',
+                cooking_time=number + 1,
+                image=f'recipes/recipe{number}.png',
+            )
+            for number in range(RECIPES_COUNT)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes
+            for ingredient in ingredients[:recipe.pk % 4 + 1]
+        )
+        Favorite.objects.bulk_create(
+            Favorite(author=cls.user, recipe=recipe) for recipe in recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(author=cls.user, recipe=recipe)
+            for recipe in recipes[::3]
+        )
+        Follow.objects.create(user=cls.user, author=authors[0])
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authorized = APIClient()
+        self.authorized.force_authenticate(self.user)
+
+    def get_list(self, client, limit):
+        cache.clear()
+        response = client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return response
+
+    def assert_constant_queries(self, client):
+        with CaptureQueriesContext(connection) as small_page:
+            self.get_list(client, 6)
+        with self.assertNumQueries(len(small_page)):
+            self.get_list(client, 50)
+
+    def test_anonymous_list_queries_do_not_depend_on_limit(self):
+        self.assert_constant_queries(self.anonymous)
+
+    def test_authorized_list_queries_do_not_depend_on_limit(self):
+        self.assert_constant_queries(self.authorized)
+
+    def test_fragments_follow_author_changes(self):
+        self.get_list(self.authorized, 6)
+        author = User.objects.get(username='author0')
+        author.first_name = 'Renamed'
+        author.save()
+        response = self.authorized.get('/api/recipes/', {'limit': 6})
+        names = {
+            recipe['author']['first_name']
+            for recipe in response.data['results']
+            if recipe['author']['username'] == 'author0'
+        }
+        self.assertEqual(names, {'Renamed'})
+
+    def test_anonymous_detail_follows_etag(self):
+        recipe = Recipe.objects.first()
+        url = f'/api/recipes/{recipe.pk}/'
+        cache.clear()
+        self.assertEqual(self.anonymous.get(url).data['name'], recipe.name)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            name='renamed', updated_at=timezone.now()
+        )
+        response = self.anonymous.get(url)
+        self.assertEqual(response.data['name'], 'renamed')
+
+    def test_tampered_cursor_is_not_found(self):
+        cursor = base64.urlsafe_b64encode(b'{"p": ["x", 1], "r": 0}')
+        response = self.anonymous.get(
+            '/api/recipes/', {'cursor': cursor.decode()}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_authorized_list_flags(self):
+        response = self.get_list(self.authorized, 50)
+        for recipe in response.data['results']:
+            self.assertEqual(
+                recipe['is_favorited'],
+                Favorite.objects.filter(
+                    author=self.user, recipe_id=recipe['id']
+                ).exists(),
+            )
+            self.assertEqual(
+                recipe['is_in_shopping_cart'],
+                ShoppingCart.objects.filter(
+                    author=self.user, recipe_id=recipe['id']
+                ).exists(),
+            )
+            self.assertEqual(
+                recipe['author']['is_subscribed'],
+                recipe['author']['username'] == 'author0',
+            )
+
+
+class RecipeWriteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@foodgram.local', username='author'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='ingredient', measurement_unit='г'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='recipe',
+            text='text',
+            cooking_time=1,
+            image='recipes/recipe.png',
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=1
+        )
+
+    def test_update_keeps_counters(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            favorites_count=5, in_carts_count=3, image_processed=True
+        )
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {'name': 'renamed'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.name, 'renamed')
+        self.assertEqual(recipe.favorites_count, 5)
+        self.assertEqual(recipe.in_carts_count, 3)
+        self.assertTrue(recipe.image_processed)
+
+    def patch_image(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4), color).save(buffer, 'PNG')
+        encoded = base64.b64encode(buffer.getvalue()).decode()
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {'image': f'data:image/png;base64,{encoded}'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return Recipe.objects.get(pk=self.recipe.pk)
+
+    def test_same_image_stays_processed(self):
+        self.enterContext(override_settings(
+            MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())
+        ))
+        recipe = self.patch_image('red')
+        self.assertFalse(recipe.image_processed)
+        Recipe.objects.filter(pk=recipe.pk).update(image_processed=True)
+        jobs = Job.objects.filter(name='recipes.process_image').count()
+
+        recipe = self.patch_image('red')
+        self.assertTrue(recipe.image_processed)
+        self.assertEqual(
+            Job.objects.filter(name='recipes.process_image').count(), jobs
+        )
+
+        recipe = self.patch_image('blue')
+        self.assertFalse(recipe.image_processed)
+        self.assertTrue(Job.objects.filter(
+            name='recipes.process_image', payload__name=recipe.image.name
+        ).exists())
+
+    def test_recipes_count_follows_orm_changes(self):
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+
+class UserWriteTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@foodgram.local',
+            username='user',
+            password='old-password',
+            avatar='users/avatar.png',
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get('/api/users/me/')
+        User.objects.filter(pk=self.user.pk).update(
+            recipes_count=4, followers_count=2
+        )
+
+    def test_shared_token_cache_has_no_password(self):
+        key = self.client._credentials['HTTP_AUTHORIZATION'].split()[1]
+        payload = cache.get(token_cache.key_prefix + key)
+        self.assertNotIn('password', payload['user'])
+        token_cache.entries.clear()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['email'], self.user.email)
+        self.assertTrue(response.data['avatar'].endswith('users/avatar.png'))
+        token_cache.entries.clear()
+        response = self.client.post(
+            '/api/users/set_password/',
+            {
+                'current_password': 'old-password',
+                'new_password': 'new-Passw0rd-42',
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 204)
+
+    def assert_counters_kept(self):
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 4)
+        self.assertEqual(self.user.followers_count, 2)
+
+    def test_avatar_delete_keeps_counters(self):
+        response = self.client.delete('/api/users/me/avatar/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters_kept()
+        self.assertFalse(self.user.avatar)
+
+    @override_settings(
+        IMAGE_UPLOAD_MAX_SIZE=1024, DATA_UPLOAD_MAX_MEMORY_SIZE=None
+    )
+    def test_multipart_avatar_is_limited_while_streaming(self):
+        response = self.client.put(
+            '/api/users/me/avatar/',
+            encode_multipart(BOUNDARY, {
+                'avatar': SimpleUploadedFile('avatar.png', b'x' * 4096),
+            }),
+            content_type=MULTIPART_CONTENT,
+        )
+        self.assertEqual(response.status_code, 413)
+
+    @override_settings(
+        IMAGE_UPLOAD_MAX_SIZE=1024, DATA_UPLOAD_MAX_MEMORY_SIZE=1024
+    )
+    def test_multipart_avatar_is_limited_by_content_length(self):
+        response = self.client.put(
+            '/api/users/me/avatar/',
+            encode_multipart(BOUNDARY, {
+                'avatar': SimpleUploadedFile('avatar.png', b'x' * 4096),
+            }),
+            content_type=MULTIPART_CONTENT,
+        )
+        self.assertEqual(response.status_code, 413)
+
+    def test_set_password_keeps_counters(self):
+        response = self.client.post(
+            '/api/users/set_password/',
+            {
+                'current_password': 'old-password',
+                'new_password': 'new-Passw0rd-42',
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters_kept()
+        self.assertTrue(self.user.check_password('new-Passw0rd-42'))
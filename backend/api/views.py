@@ -1,15 +1,26 @@
+from collections import defaultdict
+from itertools import chain
+
 from rest_framework import viewsets, status, views
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
 from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
 from django.shortcuts import get_object_or_404, redirect
 from djoser.serializers import SetPasswordSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .services import shopping_cart
-from .filters import RecipeFilter
+from .ingredient_index import ingredient_index
+from .negotiations import IgnoreFormatContentNegotiation
+from .services import (
+    SHOPPING_LIST_FORMATS,
+    get_shopping_cart_ingredients,
+    shopping_cart,
+)
+from .filters import RECIPE_ORDERINGS, RecipeFilter, search_by_name
 from .permissions import IsOwnerOrReadOnly
-from users.models import User
+from users.models import Follow, User
 from recipes.models import (
     Recipe,
     Ingredient,
@@ -17,6 +28,17 @@ from recipes.models import (
     ShoppingCart,
     RecipeShortLink,
 )
+from recipes.services import (
+    add_recipe_to_totals,
+    change_counter,
+    change_counters,
+    change_shopping_cart_totals,
+    get_ingredients_modified,
+    get_ingredients_version,
+    get_recipes_amounts,
+    lock_recipes,
+    remove_recipe_from_totals,
+)
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer,
@@ -26,14 +48,17 @@ from .serializers import (
     RecipeMinifiedSerializer,
     SetAvatarSerializer,
     FollowSerializer,
+    RecipeIdsSerializer,
 )
-from .paginations import CustomPagination
+from .mixins import AnonymousCacheMixin, ConditionalGetMixin
+from .paginations import CustomPagination, KeysetPagination
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('id')
     serializer_class = UserSerializer
     pagination_class = CustomPagination
+    cursor_ordering = {'list': ('username', 'id')}
     permission_classes = [AllowAny]
 
     def get_serializer_class(self):
@@ -41,14 +66,48 @@ class UserViewSet(viewsets.ModelViewSet):
             return UserRegistrationSerializer
         return UserSerializer
 
+    def get_user_validators(self, request, pk):
+        if not str(pk).isdigit():
+            return None
+        users = User.objects.filter(pk=pk)
+        if request.user.is_authenticated:
+            users = users.annotate(
+                is_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=request.user, author=OuterRef('pk')
+                    )
+                )
+            )
+        state = users.values(
+            'pk', 'updated_at', *users.query.annotations
+        ).first()
+        if state is None:
+            return None
+        return (
+            ('user', *state.values()),
+            None if request.user.is_authenticated else state['updated_at'],
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            super().retrieve,
+            self.get_user_validators(request, kwargs['pk']),
+            request, *args, **kwargs,
+        )
+
     @action(
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated],
     )
     def me(self, request):
-        serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
+        return self.conditional(
+            lambda request: Response(
+                self.get_serializer(request.user).data
+            ),
+            (('me', request.user.pk, request.user.updated_at), None),
+            request,
+        )
 
     @action(
         ['post'],
@@ -62,8 +121,9 @@ class UserViewSet(viewsets.ModelViewSet):
         )
 
         serializer.is_valid(raise_exception=True)
-        self.request.user.set_password(serializer.data['new_password'])
-        self.request.user.save()
+        user = User.objects.get(pk=request.user.pk)
+        user.set_password(serializer.data['new_password'])
+        user.save(update_fields=['password'])
         return Response(
             'Пароль успешно изменен',
             status=status.HTTP_204_NO_CONTENT,
@@ -78,21 +138,36 @@ class UserViewSet(viewsets.ModelViewSet):
         author = get_object_or_404(User, id=self.kwargs.get('pk'))
         user = self.request.user
         if request.method == 'POST':
+            if user == author:
+                return Response(
+                    {'detail': ['Невозможно подписаться на себя!']},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            with transaction.atomic():
+                follow = Follow.objects.insert_or_ignore(
+                    user=user, author=author
+                )
+                if follow is not None:
+                    change_counter(author, 'followers_count', 1)
+            if follow is None:
+                return Response(
+                    {'detail': ['Вы уже подписаны на этого пользователя!']},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             serializer = FollowSerializer(
-                data=request.data,
-                context={'request': request, 'author': author},
+                follow,
+                context={'request': request},
             )
-
-            serializer.is_valid(raise_exception=True)
-            serializer.save(author=author, user=user)
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED,
             )
 
-        if user.follower.filter(author=author).exists():
-            follow = user.follower.get(author=author)
-            follow.delete()
+        with transaction.atomic():
+            deleted, _ = user.follower.filter(author=author).delete()
+            if deleted:
+                change_counter(author, 'followers_count', -1)
+        if deleted:
             return Response(
                 'Успешная отписка',
                 status=status.HTTP_204_NO_CONTENT,
@@ -108,8 +183,22 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def subscriptions(self, request):
-        follows = request.user.follower.order_by('author__username')
+        follows = (
+            request.user.follower.select_related('author')
+            .order_by('author__username')
+        )
         pages = self.paginate_queryset(follows)
+
+        limit = request.query_params.get('recipes_limit')
+        author_recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_authors(
+            [follow.author_id for follow in pages],
+            int(limit) if limit and limit.isdigit() else None,
+        ):
+            author_recipes[recipe.author_id].append(recipe)
+        for follow in pages:
+            follow.author_recipes = author_recipes[follow.author_id]
+
         serializer = FollowSerializer(pages, many=True,
                                       context={'request': request})
         return self.get_paginated_response(serializer.data)
@@ -122,7 +211,7 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def avatar(self, request):
-        user = request.user
+        user = User.objects.get(pk=request.user.pk)
 
         if request.method == 'PUT':
             if 'avatar' not in request.data:
@@ -135,9 +224,6 @@ class UserViewSet(viewsets.ModelViewSet):
                                              partial=True)
             serializer.is_valid(raise_exception=True)
 
-            if user.avatar:
-                user.avatar.delete()
-
             serializer.save()
 
             return Response(
@@ -152,18 +238,83 @@ class UserViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            user.avatar.delete()
-            user.save()
+            user.avatar = None
+            user.save(update_fields=['avatar', 'updated_at'])
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin, AnonymousCacheMixin, viewsets.ModelViewSet
+):
     queryset = Recipe.objects.all()
     pagination_class = CustomPagination
     filterset_class = RecipeFilter
     permission_classes = [IsOwnerOrReadOnly]
     filter_backends = [DjangoFilterBackend]
 
+    @property
+    def cursor_ordering(self):
+        ordering = self.request.query_params.get('ordering')
+        return {
+            'list': RECIPE_ORDERINGS.get(ordering, RECIPE_ORDERINGS['newest'])
+        }
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request):
+        recipes = self.filter_queryset(self.get_queryset()).filter(
+            author__in=request.user.follower.values('author')
+        )
+        paginator = KeysetPagination()
+        paginator.ordering = self.cursor_ordering['list']
+        page = paginator.paginate_queryset(recipes, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_queryset(self):
+        recipes = Recipe.objects.with_user_flags(self.request.user)
+        if self.action in ('list', 'feed'):
+            return recipes.annotate(author_updated_at=F('author__updated_at'))
+        return recipes.with_related()
+
+    def get_recipe_validators(self, request, pk):
+        if not str(pk).isdigit():
+            return None
+        recipes = Recipe.objects.filter(pk=pk).with_user_flags(request.user)
+        state = recipes.values(
+            'pk',
+            'updated_at',
+            'author__updated_at',
+            *recipes.query.annotations,
+        ).first()
+        if state is None:
+            return None
+        ingredients_modified = get_ingredients_modified()
+        last_modified = max(
+            state['updated_at'],
+            state['author__updated_at'],
+            ingredients_modified,
+        )
+        return (
+            (
+                'recipe',
+                *state.values(),
+                get_ingredients_version(),
+                ingredients_modified,
+            ),
+            None if request.user.is_authenticated else last_modified,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            super().retrieve,
+            self.get_recipe_validators(request, kwargs['pk']),
+            request, *args, **kwargs,
+        )
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeListSerializer
@@ -186,12 +337,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, pk=pk)
 
         if request.method == 'POST':
-            if request.user.favorite.filter(recipe=recipe).exists():
+            with transaction.atomic():
+                favorite = Favorite.objects.insert_or_ignore(
+                    author=request.user, recipe=recipe
+                )
+                if favorite is not None:
+                    change_counter(recipe, 'favorites_count', 1)
+            if favorite is None:
                 return Response(
                     {'detail': ['Рецепт уже в избранном']},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            Favorite.objects.create(author=request.user, recipe=recipe)
             serializer = RecipeMinifiedSerializer(recipe)
             return Response(
                 serializer.data,
@@ -199,13 +355,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
 
         if request.method == 'DELETE':
-            favorite = request.user.favorite.filter(recipe=recipe).first()
-            if not favorite:
+            with transaction.atomic():
+                deleted, _ = request.user.favorite.filter(
+                    recipe=recipe
+                ).delete()
+                if deleted:
+                    change_counter(recipe, 'favorites_count', -1)
+            if not deleted:
                 return Response(
                     {'detail': ['Рецепта нет в избранном']},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            favorite.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -217,12 +377,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, pk=pk)
 
         if request.method == 'POST':
-            if request.user.shopping_cart.filter(recipe=recipe).exists():
+            with transaction.atomic():
+                lock_recipes([recipe.pk])
+                cart_item = ShoppingCart.objects.insert_or_ignore(
+                    author=request.user, recipe=recipe
+                )
+                if cart_item is not None:
+                    add_recipe_to_totals(request.user, recipe)
+                    change_counter(recipe, 'in_carts_count', 1)
+            if cart_item is None:
                 return Response(
                     {'detail': ['Рецепт уже в списке покупок']},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            ShoppingCart.objects.create(author=request.user, recipe=recipe)
             serializer = RecipeMinifiedSerializer(recipe)
             return Response(
                 serializer.data,
@@ -230,26 +397,119 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
 
         if request.method == 'DELETE':
-            cart_item = (
-                request.user.shopping_cart.filter(recipe=recipe).first()
-            )
-            if not cart_item:
+            with transaction.atomic():
+                lock_recipes([recipe.pk])
+                deleted, _ = request.user.shopping_cart.filter(
+                    recipe=recipe
+                ).delete()
+                if deleted:
+                    remove_recipe_from_totals(request.user, recipe)
+                    change_counter(recipe, 'in_carts_count', -1)
+            if not deleted:
                 return Response(
                     {'detail': ['Рецепта нет в списке покупок']},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            cart_item.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def change_relations(self, request, model, counter, with_totals=False):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        recipes = Recipe.objects.only('pk').in_bulk(ids)
+        user = request.user
+
+        with transaction.atomic():
+            if with_totals:
+                lock_recipes(recipes)
+            if request.method == 'POST':
+                sign = 1
+                changed = {
+                    relation.recipe_id
+                    for relation in model.objects.insert_or_ignore_many([
+                        model(author=user, recipe_id=pk) for pk in recipes
+                    ])
+                }
+                statuses = ('added', 'exists')
+            else:
+                sign = -1
+                relations = model.objects.filter(
+                    author=user, recipe_id__in=recipes
+                )
+                changed = set(
+                    relations.select_for_update()
+                    .values_list('recipe_id', flat=True)
+                )
+                relations.filter(recipe_id__in=changed).delete()
+                statuses = ('removed', 'absent')
+
+            if changed:
+                change_counters(
+                    Recipe.objects.filter(pk__in=changed), counter, sign
+                )
+                if with_totals:
+                    change_shopping_cart_totals(
+                        [user.pk],
+                        {
+                            ingredient_id: sign * amount
+                            for ingredient_id, amount
+                            in get_recipes_amounts(changed).items()
+                        },
+                    )
+
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in recipes
+                    else statuses[0] if pk in changed
+                    else statuses[1]
+                ),
+            }
+            for pk in ids
+        ]})
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        permission_classes=[IsAuthenticated],
+    )
+    def favorite_batch(self, request):
+        return self.change_relations(request, Favorite, 'favorites_count')
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated],
+    )
+    def shopping_cart_batch(self, request):
+        return self.change_relations(
+            request, ShoppingCart, 'in_carts_count', with_totals=True
+        )
+
     @action(
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated],
+        content_negotiation_class=IgnoreFormatContentNegotiation,
     )
     def download_shopping_cart(self, request):
-        author = User.objects.get(id=self.request.user.pk)
-        if author.shopping_cart.exists():
-            return shopping_cart(self, request, author)
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'format': [
+                    'Доступные форматы: '
+                    + ', '.join(SHOPPING_LIST_FORMATS)
+                ]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ingredients = get_shopping_cart_ingredients(request.user)
+        first = next(ingredients, None)
+        if first is not None:
+            return shopping_cart(chain([first], ingredients), file_format)
 
         return Response(
             'Список покупок пуст.',
@@ -257,16 +517,40 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        name = self.request.query_params.get('name')
-        if name:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+    def get_ingredients_validators(self):
+        modified = get_ingredients_modified()
+        return ('ingredients', get_ingredients_version(), modified), modified
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(
+            self.list_ingredients,
+            self.get_ingredients_validators(),
+            request, *args, **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            super().retrieve,
+            self.get_ingredients_validators(),
+            request, *args, **kwargs,
+        )
+
+    def list_ingredients(self, request, *args, **kwargs):
+        limit = request.query_params.get('limit')
+        limit = int(limit) if limit and limit.isdigit() else None
+        search = request.query_params.get('search')
+        if search:
+            queryset = search_by_name(self.get_queryset(), search)[:limit]
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+        return Response(ingredient_index.search(
+            request.query_params.get('name', ''),
+            limit,
+        ))
 
 
 class ShortLinkRedirect(views.APIView):
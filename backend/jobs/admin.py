@@ -0,0 +1,25 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'attempts',
+        'run_at',
+        'finished_at',
+    )
+    list_filter = ('status', 'name')
+    readonly_fields = (
+        'attempts',
+        'locked_at',
+        'last_error',
+        'created_at',
+        'finished_at',
+    )
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.services import (
+    claim_job,
+    release_stale_jobs,
+    run_job,
+    schedule_periodic_jobs,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди в базе данных. '
+        'Несколько воркеров могут работать одновременно'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди в секундах',
+        )
+
+    def handle(self, *args, **kwargs):
+        processed = failed = 0
+        while True:
+            close_old_connections()
+            release_stale_jobs()
+            if not kwargs['once']:
+                schedule_periodic_jobs()
+            while job := claim_job():
+                if run_job(job):
+                    processed += 1
+                else:
+                    failed += 1
+                    self.stderr.write(
+                        f'Задача {job.name} #{job.pk} завершилась '
+                        f'с ошибкой (попытка {job.attempts})'
+                    )
+            if kwargs['once']:
+                break
+            time.sleep(kwargs['sleep'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {processed}, с ошибкой: {failed}'
+        ))
@@ -0,0 +1,53 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=100)
+
+    payload = models.JSONField('Параметры', default=dict)
+
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+
+    max_attempts = models.PositiveSmallIntegerField('Максимум попыток')
+
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'], name='job_status_run_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
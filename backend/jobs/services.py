@@ -0,0 +1,90 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+
+
+TASKS = {}
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(task_name, run_at=None, **payload):
+    return Job.objects.create(
+        name=task_name,
+        payload=payload,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def get_retry_delay(attempts):
+    return timedelta(seconds=min(
+        settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.JOB_RETRY_MAX_DELAY,
+    ))
+
+
+def release_stale_jobs():
+    return Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOB_LOCK_TIMEOUT
+        ),
+    ).update(status=Job.PENDING, locked_at=None)
+
+
+def schedule_periodic_jobs():
+    now = timezone.now()
+    for name, interval in settings.JOB_SCHEDULE.items():
+        if not Job.objects.filter(
+            name=name, status__in=(Job.PENDING, Job.RUNNING)
+        ).exists():
+            enqueue(name, run_at=now + timedelta(seconds=interval))
+
+
+def claim_job():
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.PENDING, run_at__lte=timezone.now())
+            .order_by('run_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_at = timezone.now()
+        job.save(update_fields=['status', 'attempts', 'locked_at'])
+    return job
+
+
+def run_job(job):
+    try:
+        TASKS[job.name](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + get_retry_delay(job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save(update_fields=[
+        'status', 'run_at', 'locked_at', 'last_error', 'finished_at'
+    ])
+    return job.status == Job.DONE
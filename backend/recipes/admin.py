@@ -7,6 +7,7 @@ from .models import (
     Recipe,
     ShoppingCart,
 )
+from .services import tracking_recipe_totals
 
 
 class FavoriteAdmin(admin.ModelAdmin):
@@ -33,6 +34,23 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         'amount',
     )
 
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.add(form.initial['recipe'])
+        with tracking_recipe_totals(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with tracking_recipe_totals([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with tracking_recipe_totals(
+            set(queryset.values_list('recipe_id', flat=True))
+        ):
+            super().delete_queryset(request, queryset)
+
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
@@ -50,8 +68,12 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     inlines = [RecipeIngredientInline]
 
+    def save_related(self, request, form, formsets, change):
+        with tracking_recipe_totals([form.instance.pk]):
+            super().save_related(request, form, formsets, change)
+
     def in_favorite(self, obj):
-        return obj.favorite.all().count()
+        return obj.favorites_count
 
     in_favorite.short_description = 'Добавленные рецепты в избранное'
 
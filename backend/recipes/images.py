@@ -0,0 +1,102 @@
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .storage import DERIVED_DIR
+
+
+VARIANT_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+
+def get_variant_name(name, width, file_format):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(
+        directory, DERIVED_DIR, f'{filename}_{width}.{file_format}'
+    )
+
+
+def get_source_name(name):
+    directory, filename = posixpath.split(name)
+    if posixpath.basename(directory) != DERIVED_DIR:
+        return name
+    return posixpath.join(
+        posixpath.dirname(directory), filename.rsplit('_', 1)[0]
+    )
+
+
+def get_variant_names(name):
+    return [
+        get_variant_name(name, width, file_format)
+        for width in settings.IMAGE_VARIANT_WIDTHS
+        for file_format in VARIANT_FORMATS
+    ]
+
+
+def has_variants(field_file):
+    return all(
+        field_file.storage.exists(name)
+        for name in get_variant_names(field_file.name)
+    )
+
+
+def render_variant(image, width, file_format):
+    if image.width > width:
+        image = image.resize(
+            (width, max(1, round(image.height * width / image.width))),
+            Image.LANCZOS,
+        )
+    if file_format == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        VARIANT_FORMATS[file_format],
+        quality=settings.IMAGE_VARIANT_QUALITY,
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def make_variants(field_file):
+    with field_file.open('rb'):
+        image = ImageOps.exif_transpose(Image.open(field_file))
+        image = image.convert(
+            'RGBA' if 'A' in image.getbands() else 'RGB'
+        )
+    storage = field_file.storage
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        for file_format in VARIANT_FORMATS:
+            name = get_variant_name(field_file.name, width, file_format)
+            storage.delete(name)
+            storage.save(name, render_variant(image, width, file_format))
+
+
+def delete_variants(field_file):
+    for name in get_variant_names(field_file.name):
+        field_file.storage.delete(name)
+
+
+def get_srcset(field_file, processed, request=None):
+    if not field_file:
+        return None
+    if not processed:
+        return {'status': 'processing'}
+    srcset = {'status': 'ready'}
+    for file_format in VARIANT_FORMATS:
+        urls = []
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            url = field_file.storage.url(
+                get_variant_name(field_file.name, width, file_format)
+            )
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls.append(f'{url} {width}w')
+        srcset[file_format] = ', '.join(urls)
+    return srcset
@@ -0,0 +1,97 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.filters import search_by_name
+from recipes.models import Ingredient
+
+
+SEARCH_INDEXES = (
+    'ingredient_name_upper_idx',
+    'ingredient_name_trgm_idx',
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время поиска ингредиентов по префиксу и '
+        'подстроке с индексами и без. Тестовый каталог создаётся в '
+        'транзакции и откатывается'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100_000,
+            help='Размер тестового каталога',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество повторов каждого замера',
+        )
+        parser.add_argument('--prefix', default='абри')
+        parser.add_argument('--search', default='варенье')
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Команда работает только с PostgreSQL')
+        try:
+            with transaction.atomic():
+                self.fill_catalog(kwargs['rows'])
+                self.run('С индексами', kwargs)
+                with connection.cursor() as cursor:
+                    for index in SEARCH_INDEXES:
+                        cursor.execute(f'DROP INDEX {index}')
+                self.run('Без индексов', kwargs)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def fill_catalog(self, rows):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError(
+                'Сначала загрузите ингредиенты: load_ingredients'
+            )
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f'{random.choice(names)} {number}',
+                    measurement_unit='г',
+                )
+                for number in range(rows)
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Ingredient._meta.db_table}')
+
+    def run(self, title, kwargs):
+        queries = {
+            'Префикс': Ingredient.objects.filter(
+                name__istartswith=kwargs['prefix']
+            ),
+            'Поиск': search_by_name(
+                Ingredient.objects.all(), kwargs['search']
+            )[:20],
+        }
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_LABEL(name))
+            self.stdout.write(queryset.explain(analyze=True))
+            started = time.perf_counter()
+            for _ in range(kwargs['repeat']):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(
+                f'Среднее время: {elapsed / kwargs["repeat"]:.2f} мс'
+            )
@@ -0,0 +1,116 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartIngredient,
+)
+from recipes.services import rebuild_shopping_cart_totals
+from users.models import User
+
+
+INGREDIENTS_PER_RECIPE = 10
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость выгрузки списка покупок: агрегация '
+        'по рецептам против материализованных сумм. Тестовые данные '
+        'создаются в транзакции и откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='Количество рецептов в корзине',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество повторов каждого замера',
+        )
+
+    def handle(self, *args, **kwargs):
+        if not Ingredient.objects.exists():
+            self.stdout.write(self.style.ERROR(
+                'Сначала загрузите ингредиенты: load_ingredients'
+            ))
+            return
+        try:
+            with transaction.atomic():
+                for size in kwargs['sizes']:
+                    self.run(size, kwargs['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, size, repeat):
+        author = User.objects.create(
+            email=f'benchmark-{size}@foodgram.local',
+            username=f'benchmark-{size}',
+        )
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f'benchmark-{number}',
+                text='benchmark',
+                cooking_time=1,
+                image='recipes/benchmark.jpg',
+            )
+            for number in range(size)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=random.randint(1, 500))
+            for recipe in recipes
+            for ingredient_id in random.sample(
+                ingredient_ids,
+                min(INGREDIENTS_PER_RECIPE, len(ingredient_ids)),
+            )
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(author=author, recipe=recipe) for recipe in recipes
+        )
+        rebuild_shopping_cart_totals([author.pk])
+
+        aggregated = self.measure(repeat, lambda: list(
+            RecipeIngredient.objects
+            .filter(recipe__shopping_cart__author=author)
+            .values('ingredient__name', 'ingredient__measurement_unit')
+            .annotate(amounts=Sum('amount'))
+            .order_by('ingredient__name')
+        ))
+        materialized = self.measure(repeat, lambda: list(
+            ShoppingCartIngredient.objects.filter(author=author)
+            .values('ingredient__name', 'ingredient__measurement_unit',
+                    'amount')
+            .order_by('ingredient__name')
+        ))
+        self.stdout.write(
+            f'{size} рецептов: агрегация {aggregated:.2f} мс, '
+            f'материализованные суммы {materialized:.2f} мс'
+        )
+
+    def measure(self, repeat, query):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        return (time.perf_counter() - started) * 1000 / repeat
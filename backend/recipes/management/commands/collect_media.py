@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.services import (
+    BATCH_SIZE,
+    collect_media,
+    collect_orphan_media,
+    rebuild_media_references,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет медиафайлы, на которые больше не ссылаются рецепты '
+        'и пользователи, вместе с их уменьшенными копиями'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Сначала пересчитать ссылки на файлы по базе данных',
+        )
+        parser.add_argument(
+            '--orphans',
+            action='store_true',
+            help='Также удалить файлы, для которых нет записи в базе данных',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество файлов в одной пачке',
+        )
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        if kwargs['rebuild']:
+            with transaction.atomic():
+                counted = rebuild_media_references()
+            self.stdout.write(f'Ссылки пересчитаны для {counted} файлов')
+        collected = collect_media(kwargs['batch_size'])
+        if kwargs['orphans']:
+            collected += collect_orphan_media(kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {collected} за '
+            f'{time.perf_counter() - started:.2f} с'
+        ))
@@ -1,24 +1,124 @@
+import csv
+import hashlib
 import json
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient, IngredientImport
+from recipes.services import bump_ingredients_version
+
+
+BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def get_file_hash(file_path):
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        while chunk := file.read(READ_CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив ингредиентов')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+    raise CommandError('Некорректный JSON-файл')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+READERS = {
+    '.json': read_json,
+    '.csv': read_csv,
+}
 
 
 class Command(BaseCommand):
-    help = 'Загружает ингредиенты из JSON-файла в базу данных'
+    help = 'Загружает ингредиенты из JSON- или CSV-файла в базу данных'
 
     def add_arguments(self, parser):
-        parser.add_argument('file_path', type=str, help='Путь к JSON-файлу')
+        parser.add_argument(
+            'file_path',
+            type=str,
+            help='Путь к JSON- или CSV-файлу',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Загрузить файл, даже если он не менялся',
+        )
 
     def handle(self, *args, **kwargs):
-        file_path = kwargs['file_path']
+        file_path = Path(kwargs['file_path'])
+        reader = READERS.get(file_path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .json и .csv')
 
-        with open(file_path, 'r', encoding='utf-8') as file:
-            ingredients = json.load(file)
+        started = time.perf_counter()
+        file_hash = get_file_hash(file_path)
+        last_import = IngredientImport.objects.first()
+        if (
+            not kwargs['force']
+            and last_import
+            and last_import.file_hash == file_hash
+        ):
+            self.stdout.write(self.style.SUCCESS(
+                'Файл не изменился с последней загрузки, пропуск '
+                f'({time.perf_counter() - started:.2f} с)'
+            ))
+            return
 
-            for item in ingredients:
-                Ingredient.objects.get_or_create(
-                    name=item['name'],
-                    measurement_unit=item['measurement_unit']
-                )
+        total = 0
+        with transaction.atomic():
+            count_before = Ingredient.objects.count()
+            with open(file_path, 'r', encoding='utf-8') as file:
+                rows = reader(file)
+                while batch := list(islice(rows, BATCH_SIZE)):
+                    Ingredient.objects.bulk_create(
+                        (
+                            Ingredient(name=name, measurement_unit=unit)
+                            for name, unit in batch
+                        ),
+                        ignore_conflicts=True,
+                    )
+                    total += len(batch)
+            inserted = Ingredient.objects.count() - count_before
+            IngredientImport.objects.create(file_hash=file_hash)
+        if inserted:
+            bump_ingredients_version()
 
-        self.stdout.write(self.style.SUCCESS('Ингредиенты успешно загружены!'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты успешно загружены за '
+            f'{time.perf_counter() - started:.2f} с: '
+            f'добавлено {inserted}, пропущено {total - inserted}'
+        ))
@@ -0,0 +1,81 @@
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: параллельно добавляет и удаляет рецепт '
+        'из избранного и списка покупок и считает ответы и запросы. '
+        'Тестовые пользователь и рецепт удаляются после прогона'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Общее количество запросов',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=32,
+            help='Количество параллельных потоков',
+        )
+
+    def handle(self, *args, **kwargs):
+        user = User.objects.create(
+            email='loadtest@foodgram.local',
+            username='loadtest',
+        )
+        recipe = Recipe.objects.create(
+            author=user,
+            name='loadtest',
+            text='loadtest',
+            cooking_time=1,
+            image='recipes/loadtest.jpg',
+        )
+        try:
+            with ThreadPoolExecutor(kwargs['workers']) as executor:
+                results = list(executor.map(
+                    lambda _: self.toggle(user, recipe),
+                    range(kwargs['requests']),
+                ))
+        finally:
+            user.delete()
+
+        statuses = Counter(status for status, _ in results)
+        queries = sum(count for _, count in results)
+        for status, count in sorted(statuses.items()):
+            self.stdout.write(f'HTTP {status}: {count}')
+        self.stdout.write(
+            f'Запросов к БД на HTTP-запрос: {queries / len(results):.2f}'
+        )
+        style = self.style.ERROR if statuses.get(500) else self.style.SUCCESS
+        self.stdout.write(style(f'Ошибок 500: {statuses.get(500, 0)}'))
+
+    def toggle(self, user, recipe):
+        client = APIClient(
+            SERVER_NAME='localhost',
+            raise_request_exception=False,
+        )
+        client.force_authenticate(user)
+        url = f'/api/recipes/{recipe.pk}/' + random.choice(
+            ('favorite/', 'shopping_cart/')
+        )
+        method = random.choice((client.post, client.delete))
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                response = method(url)
+            return response.status_code, len(queries)
+        finally:
+            connection.close()
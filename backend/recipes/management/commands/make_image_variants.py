@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.services import enqueue
+from recipes.services import IMAGE_FIELDS
+from recipes.tasks import process_image
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт уменьшенные WebP- и JPEG-копии картинок рецептов '
+        'и аватаров, у которых их ещё нет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если они уже есть',
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help='Поставить задачи в очередь вместо выполнения на месте',
+        )
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        processed = failed = 0
+        for model, field in IMAGE_FIELDS.items():
+            images = model.objects.exclude(**{f'{field}__isnull': True})
+            images = images.exclude(**{field: ''})
+            if not kwargs['force']:
+                images = images.filter(**{f'{field}_processed': False})
+            for pk, name in images.values_list('pk', field).iterator():
+                payload = {
+                    'model': model._meta.label,
+                    'pk': pk,
+                    'name': name,
+                    'force': kwargs['force'],
+                }
+                if kwargs['enqueue']:
+                    enqueue('recipes.process_image', **payload)
+                    processed += 1
+                    continue
+                try:
+                    process_image(**payload)
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, с ошибкой: {failed} '
+            f'за {time.perf_counter() - started:.2f} с'
+        ))
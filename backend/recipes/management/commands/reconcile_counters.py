@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.services import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики рецептов, избранного и подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            drift = reconcile_counters(fix=not kwargs['dry_run'])
+
+        for counter, count in drift.items():
+            style = self.style.WARNING if count else self.style.SUCCESS
+            self.stdout.write(style(f'{counter}: расхождений {count}'))
+        if kwargs['dry_run'] and any(drift.values()):
+            self.stdout.write(self.style.ERROR(
+                'Запустите команду без --dry-run, чтобы исправить счётчики'
+            ))
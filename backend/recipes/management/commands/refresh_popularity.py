@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.services import BATCH_SIZE, refresh_popularity
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг популярности рецептов. '
+        'Предназначена для периодического запуска, например из cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество рецептов в одной пачке',
+        )
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        updated = refresh_popularity(kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг обновлён у {updated} рецептов за '
+            f'{time.perf_counter() - started:.2f} с'
+        ))
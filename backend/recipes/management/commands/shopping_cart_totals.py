@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.services import find_totals_drift, rebuild_shopping_cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Проверяет или пересобирает суммарные списки покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересобрать суммы вместо проверки',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Ограничить пользователем с указанным id',
+        )
+
+    def handle(self, *args, **kwargs):
+        user_ids = kwargs['user_ids']
+
+        if kwargs['rebuild']:
+            with transaction.atomic():
+                created = rebuild_shopping_cart_totals(user_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f'Суммы пересобраны, записей: {created}'
+            ))
+            return
+
+        drift = find_totals_drift(user_ids)
+        for (user_id, ingredient_id), (stored, expected) in sorted(
+            drift.items()
+        ):
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'сохранено {stored}, ожидается {expected}'
+            )
+        if drift:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождений: {len(drift)}. '
+                'Запустите команду с --rebuild'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS('Расхождений нет'))
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:38
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+MAX_RECIPE_AMOUNT = 32000
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    groups = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for group in groups:
+        duplicate_ids = list(
+            Ingredient.objects.filter(
+                name=group['name'],
+                measurement_unit=group['measurement_unit'],
+            )
+            .exclude(id=group['first_id'])
+            .values_list('id', flat=True)
+        )
+        for model, owner, limit in (
+            (RecipeIngredient, 'recipe_id', MAX_RECIPE_AMOUNT),
+            (ShoppingCartIngredient, 'author_id', None),
+        ):
+            for row in model.objects.filter(ingredient_id__in=duplicate_ids):
+                kept, created = model.objects.get_or_create(
+                    ingredient_id=group['first_id'],
+                    defaults={'amount': row.amount},
+                    **{owner: getattr(row, owner)},
+                )
+                if not created:
+                    kept.amount += row.amount
+                    if limit is not None:
+                        kept.amount = min(kept.amount, limit)
+                    kept.save(update_fields=['amount'])
+                row.delete()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0020_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(max_length=64, verbose_name='Хэш файла')),
+                ('imported_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+            ],
+            options={
+                'verbose_name': 'Загрузка ингредиентов',
+                'verbose_name_plural': 'Загрузки ингредиентов',
+                'ordering': ['-imported_at'],
+            },
+        ),
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'Favorite', 'recipe'),
+    ('recipes', 'Recipe', 'in_carts_count', 'ShoppingCart', 'recipe'),
+    ('users', 'User', 'recipes_count', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'Follow', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app_label, model_name, counter, related_name, field in COUNTERS:
+        related_app = 'users' if related_name == 'Follow' else 'recipes'
+        related_model = apps.get_model(related_app, related_name)
+        apps.get_model(app_label, model_name).objects.update(**{
+            counter: Coalesce(
+                Subquery(
+                    related_model.objects.filter(**{field: OuterRef('pk')})
+                    .order_by()
+                    .values(field)
+                    .annotate(total=Count('pk'))
+                    .values('total')
+                ),
+                0,
+            )
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0022_name_search_indexes'),
+        ('users', '0005_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в список покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
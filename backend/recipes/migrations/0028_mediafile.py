@@ -0,0 +1,61 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+IMAGE_FIELDS = (
+    ('recipes', 'Recipe', 'image'),
+    ('users', 'User', 'avatar'),
+)
+
+
+def fill_media_files(apps, schema_editor):
+    references = {}
+    for app_label, model_name, field in IMAGE_FIELDS:
+        rows = (
+            apps.get_model(app_label, model_name).objects
+            .exclude(**{f'{field}__isnull': True})
+            .exclude(**{field: ''})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values_list(field, 'total')
+        )
+        for name, total in rows:
+            references[name] = references.get(name, 0) + total
+    apps.get_model('recipes', 'MediaFile').objects.bulk_create(
+        (
+            apps.get_model('recipes', 'MediaFile')(
+                name=name, references=total
+            )
+            for name, total in references.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0027_recipe_image_processed'),
+        ('users', '0008_user_avatar_processed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь к файлу')),
+                ('references', models.IntegerField(default=0, verbose_name='Количество ссылок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+                'indexes': [models.Index(fields=['references', 'updated_at'], name='media_references_updated_idx')],
+            },
+        ),
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,10 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import RowNumber, Upper
 from django.core.validators import MinValueValidator, MaxValueValidator
 import secrets
 
-from users.models import User
+from users.models import Follow, InsertOrIgnoreQuerySet, User
 
 
 MIN_VALUE_COOKING_TIME = 1
@@ -29,6 +31,108 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_upper_idx',
+            ),
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='ingredient_name_trgm_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient',
+            )
+        ]
+
+
+class IngredientImport(models.Model):
+    file_hash = models.CharField('Хэш файла', max_length=64)
+
+    imported_at = models.DateTimeField(
+        'Дата загрузки',
+        auto_now_add=True,
+    )
+
+    def __str__(self):
+        return self.file_hash
+
+    class Meta:
+        ordering = ['-imported_at']
+        verbose_name = 'Загрузка ингредиентов'
+        verbose_name_plural = 'Загрузки ингредиентов'
+
+
+class MediaFile(models.Model):
+    name = models.CharField('Путь к файлу', max_length=255, unique=True)
+
+    references = models.IntegerField('Количество ссылок', default=0)
+
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+        indexes = [
+            models.Index(
+                fields=['references', 'updated_at'],
+                name='media_references_updated_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            )
+        )
+
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    author=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    author=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_author_subscribed=models.Exists(
+                Follow.objects.filter(
+                    user=user, author=models.OuterRef('author')
+                )
+            ),
+        )
+
+    def latest_by_authors(self, author_ids, limit=None):
+        recipes = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return recipes
+        return recipes.annotate(
+            author_row_number=models.Window(
+                RowNumber(),
+                partition_by=models.F('author_id'),
+                order_by=(
+                    models.F('pub_date').desc(),
+                    models.F('id').desc(),
+                ),
+            )
+        ).filter(author_row_number__lte=limit)
 
 
 class Recipe(models.Model):
@@ -78,11 +182,42 @@ class Recipe(models.Model):
         help_text='Добавьте изображение рецепта',
     )
 
+    image_processed = models.BooleanField(
+        'Копии картинки готовы',
+        default=False,
+        editable=False,
+    )
+
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True,
     )
 
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+
+    popularity = models.FloatField(
+        'Популярность',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -91,6 +226,27 @@ class Recipe(models.Model):
         default_related_name = 'recipes'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='recipe_name_trgm_idx',
+            ),
+            models.Index(
+                fields=['-popularity', '-id'],
+                name='recipe_popularity_id_idx',
+            ),
+            models.Index(
+                fields=['cooking_time', 'id'],
+                name='recipe_cooking_time_id_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_id_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(fields=['name', 'author'],
                                     name='unique_recipes')
@@ -151,6 +307,8 @@ class BaseAuthorRecipeRelation(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = InsertOrIgnoreQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.author} - {self.recipe}'
 
@@ -177,6 +335,36 @@ class Favorite(BaseAuthorRecipeRelation):
         default_related_name = 'favorite'
 
 
+class ShoppingCartIngredient(models.Model):
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+    )
+
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+    )
+
+    amount = models.PositiveIntegerField('Количество', default=0)
+
+    def __str__(self):
+        return f'{self.author} - {self.ingredient} - {self.amount}'
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        default_related_name = 'shopping_cart_ingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'ingredient'],
+                name='unique_shopping_cart_ingredient',
+            )
+        ]
+
+
 class RecipeShortLink(models.Model):
     recipe = models.OneToOneField(
         Recipe,
@@ -0,0 +1,441 @@
+import posixpath
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Follow, User
+from .images import get_source_name, get_variant_names
+from .models import (
+    Favorite,
+    MediaFile,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartIngredient,
+)
+
+
+BATCH_SIZE = 1000
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+IMAGE_FIELDS = {
+    Recipe: 'image',
+    User: 'avatar',
+}
+INGREDIENTS_MODIFIED_KEY = 'ingredients-modified'
+INGREDIENTS_VERSION_KEY = 'ingredients-version'
+POPULARITY_CART_WEIGHT = 0.5
+POPULARITY_GRAVITY = 1.5
+RECIPES_VERSION_KEY = 'recipes-version'
+
+
+def get_ingredients_version():
+    cache.add(INGREDIENTS_VERSION_KEY, 1, None)
+    return cache.get(INGREDIENTS_VERSION_KEY)
+
+
+def bump_ingredients_version():
+    try:
+        cache.incr(INGREDIENTS_VERSION_KEY)
+    except ValueError:
+        cache.set(INGREDIENTS_VERSION_KEY, 1, None)
+    cache.set(INGREDIENTS_MODIFIED_KEY, timezone.now(), None)
+
+
+def get_ingredients_modified():
+    cache.add(INGREDIENTS_MODIFIED_KEY, timezone.now(), None)
+    return cache.get(INGREDIENTS_MODIFIED_KEY)
+
+
+def get_recipes_version():
+    cache.add(RECIPES_VERSION_KEY, 1, None)
+    return cache.get(RECIPES_VERSION_KEY)
+
+
+def bump_recipes_version():
+    try:
+        cache.incr(RECIPES_VERSION_KEY)
+    except ValueError:
+        cache.set(RECIPES_VERSION_KEY, 1, None)
+
+
+def change_counters(queryset, field, delta):
+    queryset.update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def change_counter(instance, field, delta):
+    change_counters(
+        type(instance).objects.filter(pk=instance.pk), field, delta
+    )
+
+
+def count_related(related_model, field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def reconcile_counters(fix=True):
+    drift = {}
+    for model, counter, related_model, field in COUNTERS:
+        drifted = model.objects.annotate(
+            actual=count_related(related_model, field)
+        ).exclude(**{counter: F('actual')})
+        name = f'{model._meta.label}.{counter}'
+        drift[name] = drifted.count()
+        if fix and drift[name]:
+            model.objects.filter(pk__in=drifted.values('pk')).update(
+                **{counter: count_related(related_model, field)}
+            )
+    return drift
+
+
+def get_recipe_amounts(recipe):
+    return dict(
+        RecipeIngredient.objects.filter(recipe=recipe)
+        .values_list('ingredient_id', 'amount')
+    )
+
+
+def get_recipes_amounts(recipe_ids):
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .order_by()
+        .values('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .values_list('ingredient_id', 'total')
+    )
+
+
+def get_amounts_delta(old_amounts, new_amounts):
+    return {
+        ingredient_id: (
+            new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+        )
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+
+
+def lock_recipes(recipe_ids):
+    return list(
+        Recipe.objects.select_for_update()
+        .filter(pk__in=recipe_ids)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+
+
+@contextmanager
+def tracking_recipe_totals(recipe_ids):
+    recipe_ids = lock_recipes(recipe_ids)
+    old_amounts = {pk: get_recipe_amounts(pk) for pk in recipe_ids}
+    yield
+    for pk in recipe_ids:
+        change_recipe_in_totals(pk, old_amounts[pk], get_recipe_amounts(pk))
+
+
+def get_cart_author_ids(recipe):
+    return list(
+        ShoppingCart.objects.filter(recipe=recipe)
+        .values_list('author_id', flat=True)
+    )
+
+
+def change_shopping_cart_totals(author_ids, deltas):
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items()
+        if delta
+    }
+    if not author_ids or not deltas:
+        return
+
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                author_id=author_id,
+                ingredient_id=ingredient_id,
+            )
+            for author_id in author_ids
+            for ingredient_id, delta in deltas.items()
+            if delta > 0
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    totals = ShoppingCartIngredient.objects.filter(
+        author_id__in=author_ids,
+        ingredient_id__in=deltas,
+    )
+    totals.update(
+        amount=Greatest(
+            F('amount') + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=Value(0),
+            ),
+            Value(0),
+        )
+    )
+    totals.filter(amount=0).delete()
+
+
+def add_recipe_to_totals(author, recipe):
+    change_shopping_cart_totals([author.pk], get_recipe_amounts(recipe))
+
+
+def remove_recipe_from_totals(author, recipe):
+    change_shopping_cart_totals(
+        [author.pk],
+        get_amounts_delta(get_recipe_amounts(recipe), {}),
+    )
+
+
+def change_recipe_in_totals(recipe, old_amounts, new_amounts):
+    change_shopping_cart_totals(
+        get_cart_author_ids(recipe),
+        get_amounts_delta(old_amounts, new_amounts),
+    )
+
+
+def aggregate_shopping_carts(author_ids=None):
+    rows = RecipeIngredient.objects.filter(
+        recipe__shopping_cart__isnull=False,
+    )
+    if author_ids is not None:
+        rows = rows.filter(recipe__shopping_cart__author_id__in=author_ids)
+    return {
+        (row['recipe__shopping_cart__author'], row['ingredient']):
+        row['total']
+        for row in (
+            rows.values('recipe__shopping_cart__author', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+    }
+
+
+def get_stored_totals(author_ids=None):
+    totals = ShoppingCartIngredient.objects.all()
+    if author_ids is not None:
+        totals = totals.filter(author_id__in=author_ids)
+    return {
+        (author_id, ingredient_id): amount
+        for author_id, ingredient_id, amount in (
+            totals.values_list('author_id', 'ingredient_id', 'amount')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+    }
+
+
+def find_totals_drift(author_ids=None):
+    expected = aggregate_shopping_carts(author_ids)
+    stored = get_stored_totals(author_ids)
+    return {
+        key: (stored.get(key, 0), expected.get(key, 0))
+        for key in expected.keys() | stored.keys()
+        if stored.get(key, 0) != expected.get(key, 0)
+    }
+
+
+def rebuild_shopping_cart_totals(author_ids=None):
+    totals = ShoppingCartIngredient.objects.all()
+    if author_ids is not None:
+        totals = totals.filter(author_id__in=author_ids)
+    totals.delete()
+    created = ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                author_id=author_id,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for (author_id, ingredient_id), amount
+            in aggregate_shopping_carts(author_ids).items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return len(created)
+
+
+def get_popularity(recipe, now):
+    age_hours = max((now - recipe.pub_date).total_seconds(), 0) / 3600
+    return (
+        recipe.favorites_count
+        + POPULARITY_CART_WEIGHT * recipe.in_carts_count
+    ) / (age_hours + 2) ** POPULARITY_GRAVITY
+
+
+def refresh_popularity(batch_size=BATCH_SIZE):
+    now = timezone.now()
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Recipe.objects.filter(pk__gt=last_id)
+            .order_by('pk')
+            .only('pub_date', 'favorites_count', 'in_carts_count',
+                  'popularity')[:batch_size]
+        )
+        if not batch:
+            if updated:
+                bump_recipes_version()
+            return updated
+        changed = []
+        for recipe in batch:
+            popularity = get_popularity(recipe, now)
+            if popularity != recipe.popularity:
+                recipe.popularity = popularity
+                changed.append(recipe)
+        Recipe.objects.bulk_update(changed, ['popularity'])
+        updated += len(changed)
+        last_id = batch[-1].pk
+
+
+def retain_media(name):
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name)], ignore_conflicts=True
+    )
+    MediaFile.objects.filter(name=name).update(
+        references=F('references') + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def release_media(name):
+    MediaFile.objects.filter(name=name).update(
+        references=Greatest(F('references') - 1, Value(0)),
+        updated_at=timezone.now(),
+    )
+
+
+def count_media_references():
+    references = Counter()
+    for model, field in IMAGE_FIELDS.items():
+        references.update(dict(
+            model.objects.exclude(**{f'{field}__isnull': True})
+            .exclude(**{field: ''})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values_list(field, 'total')
+        ))
+    return references
+
+
+def rebuild_media_references():
+    references = count_media_references()
+    MediaFile.objects.filter(references__gt=0).update(
+        references=0,
+        updated_at=timezone.now(),
+    )
+    MediaFile.objects.bulk_create(
+        (
+            MediaFile(name=name, references=count)
+            for name, count in references.items()
+        ),
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['name'],
+        update_fields=['references'],
+    )
+    return len(references)
+
+
+def collect_media(batch_size=BATCH_SIZE):
+    deadline = timezone.now() - timedelta(
+        seconds=settings.MEDIA_GC_GRACE_PERIOD
+    )
+    collected = 0
+    while True:
+        with transaction.atomic():
+            names = list(
+                MediaFile.objects.select_for_update(skip_locked=True)
+                .filter(references__lte=0, updated_at__lt=deadline)
+                .values_list('name', flat=True)[:batch_size]
+            )
+            if not names:
+                return collected
+            MediaFile.objects.filter(
+                name__in=names, references__lte=0
+            ).delete()
+            for name in names:
+                for file_name in (name, *get_variant_names(name)):
+                    default_storage.delete(file_name)
+        collected += len(names)
+
+
+def iter_media_files(directory):
+    directories, files = default_storage.listdir(directory)
+    for file_name in files:
+        yield posixpath.join(directory, file_name)
+    for name in directories:
+        yield from iter_media_files(posixpath.join(directory, name))
+
+
+def delete_orphan_media(names, deadline):
+    sources = {name: get_source_name(name) for name in names}
+    known = set(
+        MediaFile.objects.filter(name__in=set(sources.values()))
+        .values_list('name', flat=True)
+    )
+    collected = 0
+    for name in names:
+        if sources[name] in known or (
+            default_storage.get_modified_time(name) >= deadline
+        ):
+            continue
+        default_storage.delete(name)
+        collected += 1
+    return collected
+
+
+def collect_orphan_media(batch_size=BATCH_SIZE):
+    deadline = timezone.now() - timedelta(
+        seconds=settings.MEDIA_GC_GRACE_PERIOD
+    )
+    collected = 0
+    names = []
+    for model, field in IMAGE_FIELDS.items():
+        directory = model._meta.get_field(field).upload_to
+        if not default_storage.exists(directory):
+            continue
+        for name in iter_media_files(directory):
+            if default_storage.get_modified_time(name) < deadline:
+                names.append(name)
+            if len(names) >= batch_size:
+                collected += delete_orphan_media(names, deadline)
+                names = []
+    return collected + delete_orphan_media(names, deadline)
@@ -0,0 +1,121 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from users.models import User
+from jobs.services import enqueue
+from .models import Ingredient, Recipe, RecipeIngredient
+from .services import (
+    IMAGE_FIELDS,
+    bump_ingredients_version,
+    bump_recipes_version,
+    change_counters,
+    change_recipe_in_totals,
+    get_recipe_amounts,
+    lock_recipes,
+    release_media,
+    retain_media,
+)
+
+
+DEFERRED = object()
+USER_PUBLIC_FIELDS = {
+    'avatar',
+    'email',
+    'first_name',
+    'last_name',
+    'username',
+}
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    transaction.on_commit(bump_ingredients_version)
+    transaction.on_commit(bump_recipes_version)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_changed(sender, **kwargs):
+    transaction.on_commit(bump_recipes_version)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counters(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    lock_recipes([instance.pk])
+    change_recipe_in_totals(instance, get_recipe_amounts(instance), {})
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counters(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    if update_fields is None or USER_PUBLIC_FIELDS & set(update_fields):
+        transaction.on_commit(bump_recipes_version)
+
+
+def get_image_name(instance):
+    value = instance.__dict__.get(IMAGE_FIELDS[type(instance)], DEFERRED)
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_image(sender, instance, **kwargs):
+    instance._original_image = get_image_name(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def image_saved(sender, instance, created, **kwargs):
+    name = get_image_name(instance)
+    original = '' if created else getattr(
+        instance, '_original_image', DEFERRED
+    )
+    if DEFERRED in (name, original) or name == original:
+        return
+    processed = f'{IMAGE_FIELDS[sender]}_processed'
+    if getattr(instance, processed):
+        setattr(instance, processed, False)
+        sender.objects.filter(pk=instance.pk).update(**{processed: False})
+    if original:
+        release_media(original)
+    if name:
+        retain_media(name)
+        enqueue(
+            'recipes.process_image',
+            model=sender._meta.label,
+            pk=instance.pk,
+            name=name,
+        )
+    instance._original_image = name
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def image_deleted(sender, instance, **kwargs):
+    name = get_image_name(instance)
+    if name and name is not DEFERRED:
+        release_media(name)
@@ -0,0 +1,50 @@
+import hashlib
+import os
+import posixpath
+
+from django.apps import apps
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+
+DERIVED_DIR = 'variants'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def get_content_name(self, name, content):
+        content_hash = hashlib.sha256()
+        for chunk in content.chunks():
+            content_hash.update(chunk)
+        content.seek(0)
+        digest = content_hash.hexdigest()
+        return posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest + posixpath.splitext(name)[1].lower(),
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if posixpath.basename(posixpath.dirname(name)) != DERIVED_DIR:
+            name = self.get_content_name(name, content)
+            self.touch(name)
+            if self.exists(name):
+                os.utime(self.path(name))
+                return name
+        return super().save(name, content, max_length)
+
+    def touch(self, name):
+        MediaFile = apps.get_model('recipes', 'MediaFile')
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name)],
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['updated_at'],
+        )
@@ -0,0 +1,55 @@
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.services import task
+from .images import has_variants, make_variants
+from .models import Recipe
+from . import services
+from .services import IMAGE_FIELDS
+
+
+def get_field_file(model, name):
+    field = IMAGE_FIELDS[model]
+    return getattr(model(**{field: name}), field)
+
+
+@task('recipes.process_image')
+@transaction.atomic
+def process_image(model, pk, name, force=False):
+    model = apps.get_model(model)
+    field = IMAGE_FIELDS[model]
+    instances = model.objects.filter(pk=pk, **{field: name})
+    if not instances.exists():
+        return
+    field_file = get_field_file(model, name)
+    if force or not has_variants(field_file):
+        make_variants(field_file)
+    instances.update(**{
+        f'{field}_processed': True,
+        'updated_at': timezone.now(),
+    })
+    if model is Recipe:
+        transaction.on_commit(services.bump_recipes_version)
+
+
+@task('recipes.collect_media')
+def collect_media():
+    services.collect_media()
+
+
+@task('recipes.collect_orphan_media')
+def collect_orphan_media():
+    services.collect_orphan_media()
+
+
+@task('recipes.reconcile_counters')
+@transaction.atomic
+def reconcile_counters():
+    services.reconcile_counters()
+
+
+@task('recipes.refresh_popularity')
+@transaction.atomic
+def refresh_popularity():
+    services.refresh_popularity()
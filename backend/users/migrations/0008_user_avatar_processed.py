@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_processed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Копии аватара готовы'),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connections, models
 from django.core.validators import RegexValidator
 
 
@@ -39,15 +39,86 @@ class User(AbstractUser):
         default=None,
     )
 
+    avatar_processed = models.BooleanField(
+        'Копии аватара готовы',
+        default=False,
+        editable=False,
+    )
+
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ['username']
+        indexes = [
+            models.Index(
+                fields=['username', 'id'], name='user_username_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.username
 
 
+class InsertOrIgnoreQuerySet(models.QuerySet):
+    def insert_or_ignore_many(self, objs):
+        if not objs:
+            return []
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        fields = [
+            field for field in meta.concrete_fields if not field.primary_key
+        ]
+        columns = ', '.join(quote(field.column) for field in fields)
+        row = '({})'.format(', '.join(['%s'] * len(fields)))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(meta.db_table)} ({columns}) '
+                f'VALUES {", ".join([row] * len(objs))} '
+                'ON CONFLICT DO NOTHING '
+                f'RETURNING {quote(meta.pk.column)}, {columns}',
+                [
+                    field.get_db_prep_save(
+                        getattr(obj, field.attname), connection
+                    )
+                    for obj in objs
+                    for field in fields
+                ],
+            )
+            return [
+                self.model(**{
+                    field.attname: value
+                    for field, value in zip([meta.pk, *fields], values)
+                })
+                for values in cursor.fetchall()
+            ]
+
+    def insert_or_ignore(self, **fields):
+        obj = self.model(**fields)
+        inserted = self.insert_or_ignore_many([obj])
+        if not inserted:
+            return None
+        obj.pk = inserted[0].pk
+        return obj
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -65,10 +136,21 @@ class Follow(models.Model):
         help_text='Подписаться на автора рецепта',
     )
 
+    objects = InsertOrIgnoreQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
-        ordering = ['user']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Пользователь {self.user} подписан на {self.author}'